@@ -0,0 +1,91 @@
+"""
+Cloud environment detection and workspace path resolution.
+Centralizes deployment env-var checks (Fly.io, Railway, k8s) in one place.
+"""
+import functools
+import os
+import stat
+from typing import Optional
+
+# Env vars that indicate we are running on a cloud platform.
+# Precomputed at module scope so the tuple isn't rebuilt on every call.
+CLOUD_INDICATORS = (
+    "FLY_APP_NAME",
+    "FLY_MACHINE_ID",
+    "RAILWAY_ENVIRONMENT",
+    "RAILWAY_PROJECT_ID",
+    "RAILWAY_SERVICE_ID",
+    "KUBERNETES_SERVICE_HOST",
+)
+
+
+@functools.lru_cache(maxsize=1)
+def is_cloud_environment() -> bool:
+    """
+    Check if we're running on a cloud platform (Fly.io, Railway, k8s).
+    Env vars never change within a process, so the result is cached
+    after the first call.
+    """
+    return any(map(os.environ.get, CLOUD_INDICATORS))
+
+
+@functools.lru_cache(maxsize=1)
+def get_workspace_root() -> str:
+    """
+    Resolve the root directory for session workspaces.
+    Cloud deployments use an absolute path; local dev uses a relative one.
+    """
+    override = os.environ.get("WORKSPACE_ROOT")
+    if override:
+        return override
+    return "/workspace" if is_cloud_environment() else "workspace"
+
+
+# Candidate Docker socket locations, fixed for the lifetime of the process.
+# expanduser() is resolved once here so lookups don't hit pwd.getpwuid.
+_RAILWAY_SOCKET_PATHS = (
+    "/var/run/docker.sock",
+    "/run/docker.sock",
+)
+_USER_DOCKER_SOCKET = os.path.expanduser("~/.docker/run/docker.sock")
+_SOCKET_PATHS = _RAILWAY_SOCKET_PATHS + (
+    "/run/user/1000/docker.sock",
+    _USER_DOCKER_SOCKET,
+)
+
+
+def _is_socket(path: str) -> bool:
+    """Single-stat probe that also rejects stale regular files left at socket paths."""
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+@functools.lru_cache(maxsize=1)
+def get_docker_socket_path() -> Optional[str]:
+    """
+    Find the Docker socket exposed to this machine, if any.
+    The set of sockets a machine exposes never changes after boot, so the
+    first probe is cached (get_docker_socket_path.cache_clear() for tests).
+    """
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        path = docker_host[len("unix://"):]
+        if _is_socket(path):
+            # Explicit socket is valid - skip the fallback probe entirely
+            return path
+
+    # Cloud platforms only mount the standard system sockets
+    paths = _RAILWAY_SOCKET_PATHS if is_cloud_environment() else _SOCKET_PATHS
+    for path in paths:
+        if _is_socket(path):
+            return path
+    return None
+
+
+def invalidate_env_cache():
+    """Clear cached env lookups (for tests or config reload on SIGHUP)."""
+    is_cloud_environment.cache_clear()
+    get_workspace_root.cache_clear()
+    get_docker_socket_path.cache_clear()
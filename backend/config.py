@@ -0,0 +1,41 @@
+"""
+Process-wide settings, loaded once at import.
+A frozen dataclass instead of pydantic BaseSettings: the env is read exactly
+once, and attribute access is a plain slot load with no validation overhead.
+"""
+import os
+from dataclasses import dataclass
+
+from cloud_config import is_cloud_environment
+
+# Optional .env support for local dev (single stat; dotenv may not be installed)
+if os.path.exists(".env"):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    max_sessions_per_machine: int
+    redis_url: str
+    fly_app_name: str
+    session_ttl: int  # seconds
+    warm_kernels: int  # size of the pre-started kernel pool
+    idle_timeout: int  # cull sessions idle longer than this (seconds, 0 = never)
+    distributed: bool  # enable cross-machine session routing via Redis
+
+
+settings = Settings(
+    max_sessions_per_machine=int(os.getenv("MAX_SESSIONS_PER_MACHINE", "5")),
+    redis_url=os.getenv("REDIS_URL", "redis://localhost:6379"),
+    fly_app_name=os.getenv("FLY_APP_NAME", "orca-67"),
+    session_ttl=int(os.getenv("SESSION_TTL", "3600")),
+    warm_kernels=int(os.getenv("ORCA_WARM_KERNELS", "1")),
+    idle_timeout=int(os.getenv("ORCA_IDLE_TIMEOUT", "1800")),
+    # Cloud deployments scale across machines and need the registry;
+    # single-node local runs skip the Redis round-trips entirely
+    distributed=os.getenv("ORCA_DISTRIBUTED", "1" if is_cloud_environment() else "0") == "1",
+)
@@ -4,11 +4,21 @@ Manages kernel lifecycle and communication.
 """
 import uuid
 import asyncio
+import io
+import os
+import sys
 import time
-from typing import Dict, Optional
+from dataclasses import dataclass
+from typing import Dict, Optional, TYPE_CHECKING
+import zmq.asyncio
 from jupyter_client import AsyncKernelManager, AsyncKernelClient
 from pathlib import Path
-import json
+
+# One ZMQ context for every kernel's sockets. Each default-constructed
+# context spawns its own IO thread; sharing the process singleton keeps the
+# thread and FD count flat as sessions scale. jupyter_client only destroys
+# contexts it created itself, so shutdown of one kernel can't tear this down.
+_ZMQ_CONTEXT = zmq.asyncio.Context.instance()
 
 # Import session registry for distributed sessions
 try:
@@ -16,93 +26,334 @@ try:
 except ImportError:
     SessionRegistry = None
 
+# The only kernel this service ever launches is ipykernel, so the kernelspec
+# search-path walk (a stat per directory plus a JSON parse) can be skipped by
+# building the launch command directly.
+try:
+    from ipykernel.kernelspec import make_ipkernel_cmd
+    # The argv never changes for the life of the process; build it once
+    _IPKERNEL_CMD = make_ipkernel_cmd()
+except ImportError:
+    _IPKERNEL_CMD = None
+
+try:
+    from config import settings
+except ImportError:
+    settings = None
+
+# Re-extend a session's Redis TTL at most this often (seconds). Extension is
+# idempotent, so skipping it between refreshes saves a Redis RTT per execute.
+# A quarter of the TTL keeps plenty of headroom before expiry.
+TTL_REFRESH_INTERVAL = settings.session_ttl // 4 if settings else 900
+
+# How long a session -> machine mapping may be served from the in-process
+# cache before consulting Redis again (sessions rarely migrate).
+MACHINE_CACHE_TTL = 5.0
+
+# Idle culling works in whole-second terms, so last_activity only needs to
+# move at this granularity - chatty back-to-back executes skip the write.
+ACTIVITY_GRANULARITY = 1.0
+
+# Workspace roots already created this process - instantiating another
+# manager against the same root skips the mkdir syscall entirely.
+_WORKSPACE_ROOTS_INITED: set = set()
+
+if TYPE_CHECKING:
+    from machine_forwarder import MachineForwarder
+
+# Shared forwarder (and its pooled HTTP client), created lazily on first use.
+# Imported lazily to avoid circular dependencies.
+_forwarder: Optional["MachineForwarder"] = None
+
+
+def _get_forwarder() -> "MachineForwarder":
+    global _forwarder
+    if _forwarder is None:
+        from machine_forwarder import MachineForwarder
+        _forwarder = MachineForwarder()
+    return _forwarder
+
+
+def set_forwarder(forwarder: "MachineForwarder"):
+    """Install an app-lifetime forwarder (called from the FastAPI startup hook)."""
+    global _forwarder
+    _forwarder = forwarder
+
+
+@dataclass(slots=True)
+class _ExecState:
+    """Mutable per-execution state shared with the iopub frame handlers."""
+    result: Optional[str] = None
+    error_seen: bool = False
+    complete: bool = False
+
+
+def _on_stream(content, emit, state):
+    name = content.get('name')
+    if name == 'stdout':
+        emit(('stdout', content.get('text', '')))
+    elif name == 'stderr':
+        emit(('stderr', content.get('text', '')))
+
+
+def _on_execute_result(content, emit, state):
+    state.result = content.get('data', {}).get('text/plain', '')
+    emit(('result', state.result))
+
+
+def _on_status(content, emit, state):
+    if content.get('execution_state') == 'idle':
+        # Execution completed
+        state.complete = True
+
+
+def _on_error(content, emit, state):
+    emit(('stderr', '\n'.join(content.get('traceback', ()))))
+    state.error_seen = True
+    state.complete = True
+
+
+# One hash lookup per frame instead of a chain of string compares
+_DISPATCH = {
+    'stream': _on_stream,
+    'execute_result': _on_execute_result,
+    'status': _on_status,
+    'error': _on_error,
+}
+
+
+@dataclass(slots=True)
+class SessionEntry:
+    """Bookkeeping for one local session's kernel (single dict entry per session)."""
+    km: AsyncKernelManager
+    kc: AsyncKernelClient
+    created_at: float
+    session_dir: str = ''
+    last_extend: float = 0.0
+    last_activity: float = 0.0
+    busy: int = 0  # in-flight executions; busy sessions are never culled
+
 
 class KernelManager:
     """Manages Jupyter kernels for user sessions."""
-    
-    def __init__(self, workspace_root: str = "workspace", max_sessions_per_machine: int = 5):
+
+    __slots__ = (
+        'workspace_root', '_workspace_root_str', 'sessions',
+        'max_sessions_per_machine', '_startup_lock', '_machine_cache',
+        'warm_pool_size', '_warm_pool', '_warm_filler_task', 'registry',
+        '_sessions_view', 'idle_timeout', '_culler_task',
+    )
+
+    def __init__(self, workspace_root: str = "workspace", max_sessions_per_machine: int = 5,
+                 warm_pool_size: int = 0, idle_timeout: int = 0):
         self.workspace_root = Path(workspace_root)
-        self.workspace_root.mkdir(exist_ok=True)
-        self.kernels: Dict[str, AsyncKernelManager] = {}
-        self.kernel_clients: Dict[str, any] = {}
+        # Resolve once: joins against an absolute root skip the getcwd
+        # syscall abspath would otherwise pay per call
+        self._workspace_root_str = os.path.abspath(workspace_root)
+        if self._workspace_root_str not in _WORKSPACE_ROOTS_INITED:
+            os.makedirs(self._workspace_root_str, exist_ok=True)
+            _WORKSPACE_ROOTS_INITED.add(self._workspace_root_str)
+        self.sessions: Dict[str, SessionEntry] = {}
+        self._sessions_view: tuple = ()  # cached snapshot, rebuilt on create/delete
         self.max_sessions_per_machine = max_sessions_per_machine
         self._startup_lock = asyncio.Lock()  # Prevent concurrent kernel startups
+        self._machine_cache: Dict[str, tuple] = {}  # session_id -> (machine_id, cached_at)
+
+        # Pool of already-started kernels so create_session doesn't pay the
+        # kernel boot cost on the request path (filled in the background)
+        self.warm_pool_size = warm_pool_size
+        self._warm_pool: asyncio.Queue = asyncio.Queue()
+        self._warm_filler_task = None
+
+        # Shut down kernels nobody has used for idle_timeout seconds
+        # (0 disables culling)
+        self.idle_timeout = idle_timeout
+        self._culler_task = None
         
-        # Initialize session registry for distributed scaling
-        self.registry = SessionRegistry() if SessionRegistry else None
-    
+        # Initialize session registry for distributed scaling. Single-node
+        # deployments skip it entirely so no Redis RTTs are paid per request.
+        distributed = settings.distributed if settings else True
+        self.registry = SessionRegistry() if (SessionRegistry and distributed) else None
+
+    async def _start_kernel(self, cwd: str):
+        """Start a kernel and a ready client in the given directory."""
+        # Create kernel manager with explicit timeout. When ipykernel is
+        # importable (always, in practice) launch it directly instead of
+        # resolving the 'python3' kernelspec from disk.
+        if _IPKERNEL_CMD is not None:
+            km = AsyncKernelManager(kernel_cmd=_IPKERNEL_CMD, context=_ZMQ_CONTEXT)
+        else:
+            km = AsyncKernelManager(kernel_name='python3', context=_ZMQ_CONTEXT)
+
+        # Start kernel with timeout
+        try:
+            await asyncio.wait_for(km.start_kernel(cwd=cwd), timeout=15)
+        except asyncio.TimeoutError:
+            raise Exception("Kernel startup timed out after 15 seconds")
+
+        # Get kernel client for communication
+        kc = km.client(context=_ZMQ_CONTEXT)
+        kc.start_channels()
+
+        # Wait for kernel to be ready with timeout
+        # Try a longer timeout, and if it fails, try a simple test execution instead
+        try:
+            await asyncio.wait_for(kc.wait_for_ready(), timeout=20)
+        except asyncio.TimeoutError:
+            print(f"Ready check timed out, but continuing anyway (kernel will be tested on first execution)...", file=sys.stderr)
+            # Ready check can be flaky - kernel might still work
+            # We'll test it on the first actual code execution
+
+        return km, kc
+
+    def start_warm_pool(self):
+        """Begin filling the warm kernel pool (call once an event loop is running)."""
+        self._request_warm_refill()
+
+    def start_idle_culler(self):
+        """Begin culling idle sessions (call once an event loop is running)."""
+        if self.idle_timeout > 0 and self._culler_task is None:
+            self._culler_task = asyncio.ensure_future(self._cull_loop())
+
+    def stop_idle_culler(self):
+        """Cancel the culler task (call on app shutdown)."""
+        if self._culler_task is not None:
+            self._culler_task.cancel()
+            self._culler_task = None
+
+    def next_idle_deadline(self) -> Optional[float]:
+        """Monotonic time at which the longest-idle session expires, or None."""
+        if not self.sessions:
+            return None
+        now = time.monotonic()
+        # A busy session can't expire before its execution finishes; count it
+        # as active now so the cull loop doesn't spin on its stale timestamp
+        oldest = min(now if e.busy else e.last_activity
+                     for e in self.sessions.values())
+        return oldest + self.idle_timeout
+
+    async def cull_idle(self):
+        """Shut down every session idle longer than idle_timeout."""
+        now = time.monotonic()
+        expired = [sid for sid, entry in self.sessions.items()
+                   if not entry.busy
+                   and now - entry.last_activity > self.idle_timeout]
+        for session_id in expired:
+            print(f"Culling idle session {session_id}", file=sys.stderr)
+            await self.delete_session(session_id)
+
+    async def _cull_loop(self):
+        """
+        Sleep until the earliest session could possibly expire, then cull.
+        Runs on the event loop: the scan is a GIL-held walk over a small
+        dict, so no thread dispatch is involved, and an empty machine just
+        sleeps a full idle interval.
+        """
+        while True:
+            deadline = self.next_idle_deadline()
+            if deadline is None:
+                await asyncio.sleep(self.idle_timeout)
+                continue
+            now = time.monotonic()
+            if deadline > now:
+                await asyncio.sleep(max(1.0, deadline - now))
+                continue
+            await self.cull_idle()
+
+    def _request_warm_refill(self):
+        if self.warm_pool_size <= 0:
+            return
+        if self._warm_filler_task is None or self._warm_filler_task.done():
+            self._warm_filler_task = asyncio.ensure_future(self._fill_warm_pool())
+
+    async def _fill_warm_pool(self):
+        """Top up the pool of pre-started kernels, respecting the session cap."""
+        prewarm_dir = self.workspace_root / "_prewarm"
+        prewarm_dir.mkdir(exist_ok=True, parents=True)
+        while (self._warm_pool.qsize() < self.warm_pool_size
+               and len(self.sessions) + self._warm_pool.qsize() < self.max_sessions_per_machine):
+            async with self._startup_lock:
+                try:
+                    km, kc = await self._start_kernel(str(prewarm_dir))
+                except Exception as e:
+                    print(f"Warm pool fill failed: {e}", file=sys.stderr)
+                    return
+            self._warm_pool.put_nowait((km, kc))
+            print(f"Warm kernel pool at {self._warm_pool.qsize()}/{self.warm_pool_size}", file=sys.stderr)
+
     async def create_session(self) -> str:
         """Create a new session and spawn a kernel."""
         # Check session limit
-        if len(self.kernels) >= self.max_sessions_per_machine:
+        if len(self.sessions) >= self.max_sessions_per_machine:
             raise Exception(
                 f"Maximum sessions per machine reached ({self.max_sessions_per_machine}). "
                 f"Please wait for other sessions to end or scale to more machines."
             )
         
-        session_id = str(uuid.uuid4())
+        # .hex skips UUID.__str__'s hyphen formatting; still unique and opaque
+        session_id = uuid.uuid4().hex
         km = None
         kc = None
         
         # Use lock to prevent concurrent kernel startups (can cause issues)
         async with self._startup_lock:
             try:
-                # Create workspace directory for this session
-                session_dir = self.workspace_root / session_id
-                session_dir.mkdir(exist_ok=True, parents=True)
-                
-                # Create kernel manager with explicit timeout
-                print(f"Creating kernel for session {session_id}...", file=__import__('sys').stderr)
-                km = AsyncKernelManager(kernel_name='python3')
-                
-                # Start kernel with timeout
-                try:
-                    await asyncio.wait_for(km.start_kernel(cwd=str(session_dir)), timeout=15)
-                except asyncio.TimeoutError:
-                    raise Exception("Kernel startup timed out after 15 seconds")
-                
-                print(f"Kernel started, getting client...", file=__import__('sys').stderr)
-                
-                # Get kernel client for communication
-                kc = km.client()
-                kc.start_channels()
-                
-                print(f"Waiting for kernel to be ready...", file=__import__('sys').stderr)
-                
-                # Wait for kernel to be ready with timeout
-                # Try a longer timeout, and if it fails, try a simple test execution instead
+                # Create workspace directory for this session. Session IDs are
+                # UUIDs with no path separators, so a plain join + makedirs
+                # avoids the pathlib machinery on the hot path.
+                session_dir = f"{self._workspace_root_str}/{session_id}"
+                os.makedirs(session_dir, exist_ok=True)
+
                 try:
-                    await asyncio.wait_for(kc.wait_for_ready(), timeout=20)
-                    print(f"Kernel ready check passed", file=__import__('sys').stderr)
-                except asyncio.TimeoutError:
-                    print(f"Ready check timed out, but continuing anyway (kernel will be tested on first execution)...", file=__import__('sys').stderr)
-                    # Ready check can be flaky - kernel might still work
-                    # We'll test it on the first actual code execution
-                
-                print(f"Kernel ready for session {session_id}", file=__import__('sys').stderr)
-                
-                self.kernels[session_id] = km
-                self.kernel_clients[session_id] = kc
-                
+                    # Fast path: adopt a pre-warmed kernel and move it into the
+                    # session workspace (fire-and-forget chdir on the kernel side)
+                    km, kc = self._warm_pool.get_nowait()
+                    kc.execute(f"import os; os.chdir({session_dir!r})", silent=True)
+                    print(f"Assigned warm kernel to session {session_id}", file=sys.stderr)
+                except asyncio.QueueEmpty:
+                    print(f"Creating kernel for session {session_id}...", file=sys.stderr)
+                    km, kc = await self._start_kernel(session_dir)
+
+                print(f"Kernel ready for session {session_id}", file=sys.stderr)
+
+                now = time.monotonic()
+                entry = SessionEntry(km=km, kc=kc, created_at=now,
+                                     session_dir=session_dir, last_activity=now)
+
                 # Register session in Redis (for distributed scaling)
                 if self.registry:
                     self.registry.register_session(session_id)
-                
+                    entry.last_extend = now
+
+                self.sessions[session_id] = entry
+                self._sessions_view = tuple(self.sessions)
+                self._request_warm_refill()
                 return session_id
             except Exception as e:
                 # Clean up on failure
-                print(f"Error creating session {session_id}: {str(e)}", file=__import__('sys').stderr)
+                print(f"Error creating session {session_id}: {str(e)}", file=sys.stderr)
                 if km is not None:
                     try:
                         await km.shutdown_kernel(now=True)
                     except Exception as cleanup_error:
-                        print(f"Cleanup error: {cleanup_error}", file=__import__('sys').stderr)
-                if session_id in self.kernels:
-                    del self.kernels[session_id]
-                if session_id in self.kernel_clients:
-                    del self.kernel_clients[session_id]
+                        print(f"Cleanup error: {cleanup_error}", file=sys.stderr)
+                self.sessions.pop(session_id, None)
                 raise Exception(f"Failed to create kernel: {str(e)}")
     
+    def _get_session_machine_cached(self, session_id: str) -> Optional[str]:
+        """
+        Look up which machine owns a session, serving recent answers from an
+        in-process cache to avoid a Redis round-trip on every execute.
+        """
+        cached = self._machine_cache.get(session_id)
+        now = time.monotonic()
+        if cached and now - cached[1] < MACHINE_CACHE_TTL:
+            return cached[0]
+        machine_id = self.registry.get_session_machine(session_id)
+        if machine_id is not None:
+            self._machine_cache[session_id] = (machine_id, now)
+        return machine_id
+
     async def execute_code(self, session_id: str, code: str, timeout: int = 30, forward_if_needed: bool = True):
         """
         Execute code in a session's kernel.
@@ -116,23 +367,32 @@ class KernelManager:
         # Ensure timeout is an integer
         timeout_int = int(timeout) if isinstance(timeout, (str, float)) else timeout
         
-        # Check if session exists locally
-        if session_id not in self.kernel_clients:
+        # Check if session exists locally (single dict probe)
+        entry = self.sessions.get(session_id)
+        if entry is None:
             # Check if session exists on another machine (if Redis available)
             if self.registry and forward_if_needed:
-                machine_id = self.registry.get_session_machine(session_id)
+                machine_id = self._get_session_machine_cached(session_id)
                 if machine_id and machine_id != self.registry.machine_id:
                     # Session is on another machine - forward the request via public URL
-                    # Import here to avoid circular dependencies
-                    from machine_forwarder import MachineForwarder
-                    forwarder = MachineForwarder()
+                    forwarder = _get_forwarder()
                     # Use the sessions/execute endpoint for forwarding
-                    result = await forwarder.forward_execute_request(
-                        machine_id=machine_id,
-                        session_id=session_id,
-                        code=code,
-                        timeout=timeout_int
-                    )
+                    try:
+                        result = await forwarder.forward_execute_request(
+                            machine_id=machine_id,
+                            session_id=session_id,
+                            code=code,
+                            timeout=timeout_int
+                        )
+                    except Exception:
+                        # Mapping may be stale - drop it so the next call re-resolves
+                        self._machine_cache.pop(session_id, None)
+                        raise
+                    if result.get('status_code') == 404:
+                        # Remote says the session is gone: the cached mapping
+                        # is stale, so drop it rather than serving it for the
+                        # rest of the cache TTL
+                        self._machine_cache.pop(session_id, None)
                     # Convert SessionExecuteResponse format to kernel result format
                     return {
                         'stdout': result.get('stdout', ''),
@@ -148,111 +408,230 @@ class KernelManager:
                     raise ValueError(f"Session {session_id} registered but kernel not found locally")
             raise ValueError(f"Session {session_id} not found")
         
-        # Extend session TTL on each request
-        if self.registry:
+        # Aggregate the streaming events into the blob result callers expect.
+        # StringIO avoids retaining a list of small string chunks plus a
+        # final join copy for output-heavy executions.
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        result = None
+        async for event in self.execute_stream(session_id, code, timeout_int):
+            etype = event['type']
+            if etype == 'stdout':
+                stdout.write(event['data'])
+            elif etype == 'stderr':
+                stderr.write(event['data'])
+            elif etype == 'result':
+                result = event['data']
+
+        stderr_text = stderr.getvalue()
+        return {
+            'stdout': stdout.getvalue(),
+            'stderr': stderr_text,
+            'result': result,
+            'success': not stderr_text
+        }
+
+    async def execute_batch(self, session_id: str, codes, timeout: int = 30,
+                            forward_if_needed: bool = True):
+        """
+        Run several cells back-to-back on one session's kernel.
+
+        The saving over N separate /sessions/execute calls is the per-request
+        HTTP overhead (dispatch, validation, response serialization); each
+        cell still goes through execute_code and so re-does the session
+        lookup/forwarding decision. Cells run sequentially (kernel state
+        carries across); a timed-out cell is reported as a failed result and
+        ends the batch, since the kernel is still busy with it.
+        """
+        results = []
+        for code in codes:
+            try:
+                results.append(await self.execute_code(
+                    session_id, code, timeout=timeout,
+                    forward_if_needed=forward_if_needed
+                ))
+            except TimeoutError as e:
+                results.append({
+                    'stdout': '',
+                    'stderr': str(e),
+                    'result': None,
+                    'success': False
+                })
+                break
+        return results
+
+    async def execute_stream(self, session_id: str, code: str, timeout: int = 30):
+        """
+        Execute code in a local session's kernel, yielding output as it arrives.
+
+        Yields {'type': 'stdout'|'stderr'|'result', 'data': str} events in
+        kernel order, so megabytes of training-loop output flow through in
+        chunks instead of accumulating in one buffer. Only local sessions can
+        stream; remote sessions must be reached through execute_code's
+        forwarding path.
+        """
+        timeout_int = int(timeout) if isinstance(timeout, (str, float)) else timeout
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            raise ValueError(f"Session {session_id} not found")
+        now = time.monotonic()
+        if now - entry.last_activity >= ACTIVITY_GRANULARITY:
+            entry.last_activity = now
+
+        # Extend session TTL, debounced so back-to-back executes don't each
+        # pay a Redis round-trip for an extension that changes nothing
+        if self.registry and now - entry.last_extend > TTL_REFRESH_INTERVAL:
             self.registry.extend_session_ttl(session_id)
-        
-        kc = self.kernel_clients[session_id]
-        
+            entry.last_extend = now
+
+        kc = entry.kc
+
         # Send code to kernel
         msg_id = kc.execute(code)
-        
-        # Collect output
-        stdout = []
-        stderr = []
-        result = None
-        
-        # Collect iopub messages (stdout, stderr, results) until execution completes
-        # We'll also wait for the shell reply to check for errors
+
+        # Race the shell reply against iopub draining under a single deadline,
+        # instead of re-arming 1s timers and polling time.time() on every pass.
+        loop = asyncio.get_running_loop()
+
+        # Pre-bind the per-message lookups so each loop iteration avoids
+        # repeated attribute resolution on kc/asyncio/list
+        loop_time = loop.time
+        _ensure_future = asyncio.ensure_future
+        _wait = asyncio.wait
+        _FIRST_COMPLETED = asyncio.FIRST_COMPLETED
+        _get_iopub = kc.get_iopub_msg
+        _get_shell = kc.get_shell_msg
+        _dispatch_get = _DISPATCH.get
+
+        deadline = loop_time() + timeout_int
+        shell_task = _ensure_future(_get_shell())
+        iopub_task = None
+        shell_reply = None
+        state = _ExecState()
+        # Handlers append (type, data) tuples here; the generator drains the
+        # list into yields after each frame
+        events: list = []
+        emit = events.append
+        entry.busy += 1
         try:
-            execution_complete = False
-            start_time = time.time()
-            
-            # Collect messages until execution completes
-            while not execution_complete:
-                # Check if we've exceeded timeout
-                elapsed = time.time() - start_time
-                if elapsed >= timeout_int:
+            while not state.complete:
+                remaining = deadline - loop_time()
+                if remaining <= 0:
+                    raise TimeoutError(f"Code execution timed out after {timeout_int} seconds")
+
+                # Keep one iopub awaiter in flight; respawn only after it completes
+                if iopub_task is None:
+                    iopub_task = _ensure_future(_get_iopub())
+
+                pending_tasks = {iopub_task} if shell_task is None else {shell_task, iopub_task}
+                done, _ = await _wait(
+                    pending_tasks,
+                    timeout=remaining,
+                    return_when=_FIRST_COMPLETED
+                )
+                if not done:
                     raise TimeoutError(f"Code execution timed out after {timeout_int} seconds")
-                
-                # Try to get iopub message (with short timeout)
+
+                # Drain iopub output before acting on the shell reply
+                if iopub_task in done:
+                    msg = iopub_task.result()
+                    iopub_task = None
+
+                    # Discard frames queued from earlier executions
+                    if msg.get('parent_header', {}).get('msg_id') != msg_id:
+                        continue
+
+                    handler = _dispatch_get(msg.get('msg_type', ''))
+                    if handler is not None:
+                        handler(msg.get('content', {}), emit, state)
+                        if events:
+                            for etype, data in events:
+                                yield {'type': etype, 'data': data}
+                            events.clear()
+
+                elif shell_task in done:
+                    shell_msg = shell_task.result()
+                    # Discard stale replies queued from earlier executions
+                    if shell_msg.get('parent_header', {}).get('msg_id') != msg_id:
+                        shell_task = _ensure_future(_get_shell())
+                        continue
+                    # Remember the reply but keep draining iopub until idle,
+                    # so trailing stream output isn't dropped
+                    shell_reply = shell_msg
+                    shell_task = None
+
+            # The idle status frame can beat the shell reply; wait briefly
+            # for the reply so error/aborted statuses aren't missed
+            while shell_reply is None and shell_task is not None:
+                remaining = min(deadline - loop_time(), 1.0)
+                if remaining <= 0:
+                    break
                 try:
-                    msg = await asyncio.wait_for(
-                        kc.get_iopub_msg(),
-                        timeout=1.0  # Short timeout to check for completion
-                    )
-                    
-                    msg_type = msg.get('msg_type', '')
-                    content = msg.get('content', {})
-                    
-                    if msg_type == 'stream':
-                        if content.get('name') == 'stdout':
-                            stdout.append(content.get('text', ''))
-                        elif content.get('name') == 'stderr':
-                            stderr.append(content.get('text', ''))
-                    
-                    elif msg_type == 'execute_result':
-                        result = content.get('data', {}).get('text/plain', '')
-                    
-                    elif msg_type == 'status' and content.get('execution_state') == 'idle':
-                        # Execution completed
-                        execution_complete = True
-                        break
-                    
-                    elif msg_type == 'error':
-                        stderr.append('\n'.join(content.get('traceback', [])))
-                        execution_complete = True
-                        break
-                        
+                    msg = await asyncio.wait_for(shell_task, timeout=remaining)
                 except asyncio.TimeoutError:
-                    # No iopub message, check shell channel for completion
-                    try:
-                        shell_msg = await asyncio.wait_for(
-                            kc.get_shell_msg(msg_id),
-                            timeout=0.1  # Very short timeout
-                        )
-                        # Got shell reply, execution is complete
-                        if shell_msg['content'].get('status') == 'error':
-                            error_content = shell_msg['content']
-                            stderr.append('\n'.join(error_content.get('traceback', [])))
-                        execution_complete = True
-                        break
-                    except asyncio.TimeoutError:
-                        # No shell reply yet, continue collecting iopub messages
-                        continue
-                    
+                    shell_task = None
+                    break
+                if msg.get('parent_header', {}).get('msg_id') == msg_id:
+                    shell_reply = msg
+                    shell_task = None
+                else:
+                    shell_task = _ensure_future(_get_shell())
+
+            # Surface a failed reply that produced no iopub error frame
+            if shell_reply is not None and not state.error_seen:
+                status = shell_reply['content'].get('status')
+                if status == 'error':
+                    yield {
+                        'type': 'stderr',
+                        'data': '\n'.join(shell_reply['content'].get('traceback', ()))
+                    }
+                elif status == 'aborted':
+                    # ipykernel's stop_on_error aborts executes queued behind
+                    # a failed cell without running them; there is no iopub
+                    # error frame, only this reply status
+                    yield {
+                        'type': 'stderr',
+                        'data': 'aborted due to previous error'
+                    }
+
         except TimeoutError:
             # Re-raise timeout errors
             raise
         except Exception as e:
             raise Exception(f"Kernel communication error: {str(e)}")
-        
-        return {
-            'stdout': ''.join(stdout),
-            'stderr': ''.join(stderr),
-            'result': result,
-            'success': len(stderr) == 0
-        }
-    
+        finally:
+            entry.busy -= 1
+            # Restart the idle clock from the end of the execution, not its
+            # start, so a long-running cell isn't judged idle mid-run
+            entry.last_activity = time.monotonic()
+            # Don't leak pending awaiters into the next execute call
+            for task in (shell_task, iopub_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+
     async def delete_session(self, session_id: str):
         """Delete a session and shutdown its kernel."""
-        if session_id in self.kernels:
-            km = self.kernels[session_id]
-            await km.shutdown_kernel(now=True)
-            del self.kernels[session_id]
-            del self.kernel_clients[session_id]
-        
+        entry = self.sessions.pop(session_id, None)
+        if entry is not None:
+            self._sessions_view = tuple(self.sessions)
+            await entry.km.shutdown_kernel(now=True)
+
         # Unregister from Redis
         if self.registry:
             self.registry.unregister_session(session_id)
+        self._machine_cache.pop(session_id, None)
         
-        # Clean up workspace
-        session_dir = self.workspace_root / session_id
-        if session_dir.exists():
+        # Clean up workspace (path was computed once at create time)
+        if entry is not None and os.path.isdir(entry.session_dir):
             # Optionally delete workspace files
             pass
     
     def list_sessions(self):
-        """List all active sessions."""
-        return list(self.kernels.keys())
+        """List all active sessions (cached snapshot; no per-call copy)."""
+        return self._sessions_view
+
+    def iter_sessions(self):
+        """Live view over session IDs for callers that only iterate."""
+        return self.sessions.keys()
 
@@ -2,8 +2,15 @@
 Shared kernel manager instance for the application.
 This ensures all routers use the same kernel manager.
 """
+from cloud_config import get_workspace_root
+from config import settings
 from kernel_manager import KernelManager
 
 # Global kernel manager instance
-kernel_manager = KernelManager()
+kernel_manager = KernelManager(
+    workspace_root=get_workspace_root(),
+    max_sessions_per_machine=settings.max_sessions_per_machine,
+    warm_pool_size=settings.warm_kernels,
+    idle_timeout=settings.idle_timeout,
+)
 
@@ -1,17 +1,90 @@
 """
 Machine-to-machine request forwarding for session affinity.
 Forwards requests to the correct machine when session is on a different machine.
-Uses public URL for simplicity and reliability.
+Targets the machine directly over Fly's private network, falling back to the
+public URL when the machine is unknown.
 """
+import asyncio
 import httpx
+import logging
 import os
-from typing import Dict, Any
-import sys
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Prefer orjson (C-level, returns bytes directly for the request body);
+# fall back to stdlib json when it isn't installed
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    def _dumps(obj):
+        return json.dumps(obj).encode()
+
+    _loads = json.loads
+
+# Rolling latency window per target machine, used to adapt the forward
+# timeout: fixed "timeout + 10" either kills valid slow requests or waits
+# too long on a hung peer
+_LATENCY_WINDOW = 256
+_TIMEOUT_MULTIPLIER = 3.0
+_MIN_LATENCY_SAMPLES = 20
+# Minimum headroom above the caller's code timeout, covering dispatch and
+# one round trip so a remote-side timeout response can still make it back
+_TIMEOUT_SLACK = 5.0
 
 
 class MachineForwarder:
     """Handles forwarding requests between machines using public URL."""
-    
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        # Persistent pooled client: keep-alive avoids paying a fresh
+        # TCP + TLS handshake on every forwarded request. An app-lifetime
+        # client (e.g. app.state.forward_client) can be injected.
+        self._client = client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_keepalive_connections=20,
+                max_connections=100,
+                keepalive_expiry=30.0
+            ),
+            # All forwards target one host, so HTTP/2 lets concurrent
+            # requests multiplex over a single connection
+            http2=True,
+            verify=True,  # Use HTTPS for public URL
+            follow_redirects=True
+        )
+        # Resolve env and pre-build URL parts once; the per-forward path
+        # then does a single f-string interpolation of machine_id
+        app_name = os.getenv("FLY_APP_NAME", "orca-67")
+        port = os.getenv("PORT", "8000")
+        self._internal_url_suffix = f".vm.{app_name}.internal:{port}/sessions/execute"
+        self._public_url = f"https://{app_name}.fly.dev/sessions/execute"
+        # machine_id -> deque of recent forward latencies (seconds)
+        self._latencies: Dict[str, deque] = {}
+
+    def _effective_timeout(self, machine_id: str, timeout: int) -> float:
+        """Adapt the wall-clock timeout to the target machine's observed P99."""
+        samples = self._latencies.get(machine_id)
+        if not samples or len(samples) < _MIN_LATENCY_SAMPLES:
+            # Not enough history yet; fall back to the old fixed slack
+            return timeout + 10
+        ordered = sorted(samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        # Never clamp below timeout + slack: the remote may legitimately
+        # spend the full code timeout executing before its first byte (or
+        # its own 408) arrives, so the adaptive value only ever widens the
+        # window for slow peers, never narrows it under the caller's deadline
+        return max(timeout + _TIMEOUT_SLACK, p99 * _TIMEOUT_MULTIPLIER)
+
+    async def aclose(self):
+        """Close the pooled HTTP client (call on app shutdown)."""
+        await self._client.aclose()
+
     async def forward_execute_request(
         self,
         machine_id: str,  # We only need machine_id to know it's not local
@@ -31,38 +104,112 @@ class MachineForwarder:
         Returns:
             Execution result dictionary (SessionExecuteResponse format)
         """
-        # Get app name from environment or use default
-        app_name = os.getenv("FLY_APP_NAME", "orca-67")
-        public_url = f"https://{app_name}.fly.dev"
-        url = f"{public_url}/sessions/execute"
-        
+        if machine_id:
+            # Plain HTTP over Fly's private WireGuard mesh: skips TLS and the
+            # public edge hop, and lands directly on the target machine
+            url = f"http://{machine_id}{self._internal_url_suffix}"
+        else:
+            # Public URL fallback when we don't know the target machine;
+            # the Fly proxy replays the request to whichever machine owns it
+            url = self._public_url
+
         payload = {
             "session_id": session_id,
             "code": code,
             "timeout": timeout
         }
         
-        # Use longer timeout for forwarding
-        timeout_obj = httpx.Timeout(timeout + 10, connect=10.0)
-        
-        print(f"Forwarding request for session {session_id} to machine {machine_id} via {url}", file=sys.stderr)
-        
+        timeout_obj = httpx.Timeout(
+            self._effective_timeout(machine_id, timeout), connect=10.0
+        )
+
+        # %-style args are only formatted if DEBUG is enabled, so this is
+        # effectively free in production (vs an unconditional stderr write)
+        logger.debug("Forwarding session %s to machine %s via %s",
+                     session_id, machine_id, url)
+
+        started = time.monotonic()
         try:
-            async with httpx.AsyncClient(
-                timeout=timeout_obj,
-                verify=True,  # Use HTTPS for public URL
-                follow_redirects=True
-            ) as client:
-                response = await client.post(url, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                # Ensure result is in the expected format
+            # Stream the response body: large stdout payloads arrive in
+            # chunks into one growable buffer instead of being materialized
+            # twice (transport buffer + .content bytes)
+            async with self._client.stream(
+                "POST",
+                url,
+                content=_dumps(payload),
+                headers={"Content-Type": "application/json"},
+                timeout=timeout_obj
+            ) as response:
+                if response.status_code >= 400:
+                    # Remote-side errors (overloaded peer, missing session)
+                    # come back as a structured failure rather than an
+                    # exception: no traceback allocation on a path that can
+                    # fire repeatedly when a machine is struggling
+                    error_body = await response.aread()
+                    return {
+                        'stdout': '',
+                        'stderr': f"Forward to {machine_id} failed: "
+                                  f"HTTP {response.status_code}: "
+                                  f"{error_body.decode('utf-8', errors='replace')}",
+                        'result': None,
+                        'success': False,
+                        # Callers use the status to decide whether their
+                        # session->machine mapping has gone stale
+                        'status_code': response.status_code
+                    }
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+            result = _loads(body)  # orjson and json both parse bytearray
+            # Feed the rolling window so later forwards to this machine
+            # use a data-driven timeout
+            samples = self._latencies.get(machine_id)
+            if samples is None:
+                samples = self._latencies[machine_id] = deque(maxlen=_LATENCY_WINDOW)
+            samples.append(time.monotonic() - started)
+            # Ensure result is in the expected format
+            return {
+                'stdout': result.get('stdout', ''),
+                'stderr': result.get('stderr', ''),
+                'result': result.get('result'),
+                'success': result.get('success', False)
+            }
+        except httpx.TransportError as e:
+            # Connection-level failures (DNS, refused, reset) are the only
+            # case the caller should treat as "machine unreachable"
+            raise Exception(f"Failed to forward request to {url}: {str(e)}")
+
+    async def forward_many(
+        self,
+        targets: list,  # of (machine_id, session_id) tuples
+        code: str,
+        timeout: int = 30
+    ) -> list:
+        """
+        Fan an execute request out to several machines concurrently.
+
+        All requests share the pooled HTTP/2 client, so N targets cost N
+        streams rather than N handshakes. Results come back in target
+        order; a failed forward surfaces as a success=False dict so one
+        unreachable machine doesn't sink the whole fan-out.
+        """
+        async def _one(machine_id, session_id):
+            try:
+                return await self.forward_execute_request(
+                    machine_id=machine_id,
+                    session_id=session_id,
+                    code=code,
+                    timeout=timeout
+                )
+            except Exception as e:
                 return {
-                    'stdout': result.get('stdout', ''),
-                    'stderr': result.get('stderr', ''),
-                    'result': result.get('result'),
-                    'success': result.get('success', False)
+                    'stdout': '',
+                    'stderr': str(e),
+                    'result': None,
+                    'success': False
                 }
-        except httpx.HTTPError as e:
-            raise Exception(f"Failed to forward request to {url}: {str(e)}")
+
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(_one(m, s)) for m, s in targets]
+        return [t.result() for t in tasks]
 
@@ -4,10 +4,27 @@ Simple test server for Railway deployment.
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import execute, sessions
+import httpx
 import os
 import sys
 
-app = FastAPI(title="Orca Test Server", version="0.1.0")
+# Prefer the libuv event loop when available. The Dockerfile CMD passes
+# --loop uvloop explicitly; this covers programmatic runners and dev servers
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+# Serialize responses with orjson when available (C-level, much faster on
+# large stdout/stderr payloads); fall back to the stdlib-based default
+try:
+    from fastapi.responses import ORJSONResponse as _ResponseClass
+except ImportError:
+    from fastapi.responses import JSONResponse as _ResponseClass
+
+app = FastAPI(title="Orca Test Server", version="0.1.0",
+              default_response_class=_ResponseClass)
 
 
 # Log startup info for debugging
@@ -28,6 +45,38 @@ app.include_router(execute.router)
 app.include_router(sessions.router)
 
 
+@app.on_event("startup")
+async def startup():
+    # Begin filling the warm kernel pool so the first create_session is fast,
+    # and start reclaiming kernels from abandoned sessions
+    from kernel_manager_instance import kernel_manager
+    kernel_manager.start_warm_pool()
+    kernel_manager.start_idle_culler()
+
+    # One pooled HTTP client for all machine-to-machine forwards, shared for
+    # the app's lifetime so forwards reuse keep-alive connections
+    import kernel_manager as kernel_manager_module
+    from machine_forwarder import MachineForwarder
+    app.state.forward_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=20,
+            keepalive_expiry=30.0,
+        ),
+        timeout=httpx.Timeout(40.0, connect=10.0),
+        http2=True,  # multiplex concurrent forwards onto one connection
+        follow_redirects=True,
+    )
+    kernel_manager_module.set_forwarder(MachineForwarder(client=app.state.forward_client))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    from kernel_manager_instance import kernel_manager
+    kernel_manager.stop_idle_culler()
+    await app.state.forward_client.aclose()
+
+
 @app.get("/")
 async def root():
     return {
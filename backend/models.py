@@ -1,17 +1,21 @@
 """
 Pydantic models for request/response validation.
+All models ignore unknown fields so forwarded payloads from newer/older
+machines never fail validation mid-deploy.
 """
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
 
 
 class ExecuteRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
     code: str
     timeout: int = 30  # seconds
     session_id: Optional[str] = None  # If provided, use kernel; otherwise use subprocess
 
 
 class ExecuteResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
     stdout: str
     stderr: str
     returncode: int
@@ -19,17 +23,27 @@ class ExecuteResponse(BaseModel):
 
 
 class SessionCreateResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
     session_id: str
     message: str
 
 
 class SessionExecuteRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
     session_id: str
     code: str
     timeout: int = 30
 
 
+class SessionExecuteBatchRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    session_id: str
+    codes: List[str]
+    timeout: int = 30  # per cell
+
+
 class SessionExecuteResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
     stdout: str
     stderr: str
     result: Optional[str] = None
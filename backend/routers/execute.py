@@ -3,10 +3,8 @@ Code execution endpoint.
 Supports both stateless (subprocess) and stateful (Jupyter kernel) execution.
 """
 from fastapi import APIRouter, HTTPException
+import asyncio
 import sys
-import subprocess
-import uuid
-from pathlib import Path
 
 # Import models - works when running from backend directory
 try:
@@ -21,6 +19,13 @@ except ImportError:
 
 router = APIRouter(prefix="/execute", tags=["execute"])
 
+# Returning a Response object bypasses FastAPI's response-model validation
+# pass, which forwarded results have already been through on the remote side
+try:
+    from fastapi.responses import ORJSONResponse as _ResponseClass
+except ImportError:
+    from fastapi.responses import JSONResponse as _ResponseClass
+
 # Import shared kernel manager instance
 try:
     from kernel_manager_instance import kernel_manager
@@ -53,7 +58,10 @@ async def execute_code(request: ExecuteRequest):
             if isinstance(result, dict):
                 # Check if it's already in ExecuteResponse format (from forwarding)
                 if 'returncode' in result:
-                    return ExecuteResponse(**result)
+                    # Forwarded results were already validated on the machine
+                    # that produced them; returning a Response directly skips
+                    # both Pydantic passes (construction and response_model)
+                    return _ResponseClass(content=result)
                 # Otherwise, convert from kernel result format
                 return ExecuteResponse(
                     stdout=result.get('stdout', ''),
@@ -79,44 +87,42 @@ async def execute_code(request: ExecuteRequest):
                 detail=f"Kernel execution error: {str(e)}"
             )
     
-    # Otherwise, use subprocess execution (stateless, backward compatible)
-    temp_dir = Path("/tmp")
-    temp_dir.mkdir(exist_ok=True)
-    
-    temp_file = temp_dir / f"execute_{uuid.uuid4().hex}.py"
-    
+    # Otherwise, use subprocess execution (stateless, backward compatible).
+    # The code is piped to `python -` over stdin, avoiding a temp-file
+    # write/read/unlink round-trip through /tmp per request. Runs via
+    # asyncio so the event loop keeps serving other requests meanwhile.
     try:
-        # Write code to temporary file
-        temp_file.write_text(request.code, encoding="utf-8")
-        
-        # Execute the code
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd="/tmp"
+        )
         try:
-            result = subprocess.run(
-                [sys.executable, str(temp_file)],
-                capture_output=True,
-                text=True,
-                timeout=request.timeout,
-                cwd=temp_dir
+            stdout, stderr = await asyncio.wait_for(
+                proc.communicate(request.code.encode("utf-8")),
+                timeout=request.timeout
             )
-            
-            return ExecuteResponse(
-                stdout=result.stdout,
-                stderr=result.stderr,
-                returncode=result.returncode,
-                success=result.returncode == 0
-            )
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
             raise HTTPException(
                 status_code=408,
                 detail=f"Code execution timed out after {request.timeout} seconds"
             )
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Execution error: {str(e)}"
-            )
-    finally:
-        # Clean up temporary file
-        if temp_file.exists():
-            temp_file.unlink()
+
+        return ExecuteResponse(
+            stdout=stdout.decode("utf-8", errors="replace"),
+            stderr=stderr.decode("utf-8", errors="replace"),
+            returncode=proc.returncode,
+            success=proc.returncode == 0
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Execution error: {str(e)}"
+        )
 
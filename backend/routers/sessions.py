@@ -1,10 +1,35 @@
 """
 Session management endpoints for Jupyter kernel-based execution.
 """
-from fastapi import APIRouter, HTTPException
-from models import SessionCreateResponse, SessionExecuteRequest, SessionExecuteResponse
+import asyncio
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from models import (
+    SessionCreateResponse,
+    SessionExecuteBatchRequest,
+    SessionExecuteRequest,
+    SessionExecuteResponse,
+)
 from typing import Optional
 
+# Returning a Response object bypasses FastAPI's response-model validation
+# pass, which forwarded results have already been through on the remote side
+try:
+    from fastapi.responses import ORJSONResponse as _ResponseClass
+except ImportError:
+    from fastapi.responses import JSONResponse as _ResponseClass
+
+# WebSocket frames go out as orjson-encoded binary when available: C-level
+# encode straight to bytes, vs send_json's pure-Python dumps + UTF-8 pass
+try:
+    import orjson
+
+    async def _ws_send(websocket, obj):
+        await websocket.send_bytes(orjson.dumps(obj))
+except ImportError:
+    async def _ws_send(websocket, obj):
+        await websocket.send_json(obj)
+
 # Import shared kernel manager instance
 try:
     from kernel_manager_instance import kernel_manager
@@ -15,6 +40,10 @@ except ImportError:
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
+# Max output events coalesced into one WebSocket frame. Chatty cells
+# (per-iteration prints) then pay one send syscall per batch, not per line.
+WS_BATCH_MAX = 32
+
 
 @router.post("", response_model=SessionCreateResponse)
 async def create_session():
@@ -54,7 +83,10 @@ async def execute_code(request: SessionExecuteRequest):
         if isinstance(result, dict):
             # Check if it's already in SessionExecuteResponse format (from forwarding)
             if 'result' in result:
-                return SessionExecuteResponse(**result)
+                # Forwarded results were already validated on the machine
+                # that produced them; returning a Response directly skips
+                # both Pydantic passes (construction and response_model)
+                return _ResponseClass(content=result)
             # Otherwise, convert from kernel result format
             return SessionExecuteResponse(
                 stdout=result.get('stdout', ''),
@@ -81,6 +113,114 @@ async def execute_code(request: SessionExecuteRequest):
         )
 
 
+@router.post("/execute_batch")
+async def execute_batch(request: SessionExecuteBatchRequest):
+    """
+    Execute a list of cells sequentially on one session's kernel.
+    Amortizes request dispatch and validation across the whole batch -
+    useful for notebook-style re-run-all workloads.
+    """
+    try:
+        results = await kernel_manager.execute_batch(
+            session_id=request.session_id,
+            codes=request.codes,
+            timeout=request.timeout,
+            forward_if_needed=True
+        )
+        return _ResponseClass(content={"results": results, "count": len(results)})
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Execution error: {str(e)}"
+        )
+
+
+@router.websocket("/{session_id}/execute_stream")
+async def execute_stream(websocket: WebSocket, session_id: str):
+    """
+    Execute code in a session's kernel, streaming output over a WebSocket.
+
+    The client sends {"code": ..., "timeout": ...} and receives output
+    events ({"type": "stdout"|"stderr"|"result", "data": ...}) coalesced
+    into {"type": "batch", "events": [...]} frames. Every execution ends
+    with exactly one terminal frame: {"type": "complete"} on success, or
+    {"type": "error"} for unknown sessions, timeouts, and kernel
+    failures. Multiple executes can be issued over one connection.
+    Only works on the machine that owns the session; remote sessions go
+    through /sessions/execute.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            request = await websocket.receive_json()
+            code = request.get("code", "")
+            timeout = request.get("timeout", 30)
+
+            # Pump kernel events into a queue so bursts that arrive while a
+            # frame is being sent coalesce into the next frame instead of
+            # each paying their own send syscall
+            queue: asyncio.Queue = asyncio.Queue()
+
+            async def _pump():
+                try:
+                    async for event in kernel_manager.execute_stream(
+                        session_id, code, timeout
+                    ):
+                        queue.put_nowait(event)
+                except Exception as e:
+                    # Unknown session, timeout, or kernel communication
+                    # failure - surface it as an error event either way
+                    queue.put_nowait({"type": "error", "data": str(e)})
+                finally:
+                    # Always unblock the consumer, even if the stream died
+                    queue.put_nowait(None)
+
+            pump_task = asyncio.create_task(_pump())
+            success = True
+            error_data = None
+            try:
+                finished = False
+                while not finished:
+                    event = await queue.get()
+                    if event is None:
+                        break
+                    batch = [event]
+                    while len(batch) < WS_BATCH_MAX:
+                        try:
+                            event = queue.get_nowait()
+                        except asyncio.QueueEmpty:
+                            break
+                        if event is None:
+                            finished = True
+                            break
+                        batch.append(event)
+
+                    # Error events terminate the execution and are sent as
+                    # their own top-level frame below, not inside a batch
+                    events = []
+                    for ev in batch:
+                        if ev['type'] == 'error':
+                            error_data = ev['data']
+                        else:
+                            if ev['type'] == 'stderr':
+                                success = False
+                            events.append(ev)
+                    if events:
+                        await _ws_send(websocket, {"type": "batch", "events": events})
+
+                if error_data is not None:
+                    await _ws_send(websocket, {"type": "error", "data": error_data})
+                else:
+                    await _ws_send(websocket, {"type": "complete", "success": success})
+            finally:
+                if not pump_task.done():
+                    pump_task.cancel()
+    except WebSocketDisconnect:
+        pass
+
+
 @router.delete("/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session and shutdown its kernel."""
@@ -3,48 +3,76 @@ Session registry for distributed kernel management.
 Stores session -> machine mapping in Redis for scaling across multiple machines.
 """
 import os
-import json
 import socket
 from typing import Optional
 import redis
 from redis.exceptions import RedisError
 
+from config import settings
+
+# One connection pool per process, shared by every SessionRegistry (and any
+# future Redis consumer): connections are reused across instances instead of
+# each from_url() call growing its own pool
+_POOL: Optional[redis.ConnectionPool] = None
+
+
+def _get_pool() -> redis.ConnectionPool:
+    global _POOL
+    if _POOL is None:
+        _POOL = redis.BlockingConnectionPool.from_url(
+            settings.redis_url,
+            max_connections=32,
+            timeout=1,
+            decode_responses=True,
+            # Only validate a connection if it has sat idle longer than
+            # this; fresh checkouts are trusted instead of re-pinged
+            health_check_interval=30,
+        )
+    return _POOL
+
 
 class SessionRegistry:
     """Manages session-to-machine mapping in Redis."""
-    
+
     def __init__(self):
-        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        try:
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
-            # Test connection
-            self.redis_client.ping()
-        except (RedisError, Exception) as e:
-            print(f"Warning: Redis not available: {e}. Using in-memory fallback.")
-            self.redis_client = None
-        
+        # Connect lazily: no eager ping, so construction never blocks app
+        # startup waiting on a Redis round-trip. If Redis turns out to be
+        # unreachable, the first failing call disables the client.
+        self.redis_client = redis.Redis(connection_pool=_get_pool())
+
         # Get current machine ID (use Fly.io machine ID or hostname)
         self.machine_id = os.getenv("FLY_MACHINE_ID", socket.gethostname())
-        self.app_name = os.getenv("FLY_APP_NAME", "orca-67")
+        self.app_name = settings.fly_app_name
     
-    def register_session(self, session_id: str, ttl: int = 3600):
+    def _mark_unavailable(self, e: Exception):
+        """Disable the client after a connection failure so later calls
+        short-circuit on the `if self.redis_client` guard instead of
+        re-paying the socket timeout on every request."""
+        if isinstance(e, redis.exceptions.ConnectionError):
+            print(f"Warning: Redis not available: {e}. Disabling registry for this process.")
+            self.redis_client = None
+
+    def register_session(self, session_id: str, ttl: int = settings.session_ttl):
         """
         Register a session on this machine.
-        TTL = time to live in seconds (default 1 hour)
+        TTL = time to live in seconds (defaults to settings.session_ttl)
         """
         if self.redis_client:
             try:
                 key = f"session:{session_id}"
-                self.redis_client.setex(
-                    key,
-                    ttl,
-                    json.dumps({
-                        "machine_id": self.machine_id,
-                        "session_id": session_id
-                    })
-                )
+                # Hash fields instead of a JSON blob: writes skip json.dumps,
+                # reads fetch just the field they need with no parse. Both
+                # commands ride one pipeline round-trip.
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.hset(key, mapping={
+                    "machine_id": self.machine_id,
+                    "session_id": session_id
+                })
+                pipe.expire(key, ttl)
+                pipe.execute()
                 return True
-            except RedisError:
+            except RedisError as e:
+                self._mark_unavailable(e)
                 return False
         return False
     
@@ -53,12 +81,9 @@ class SessionRegistry:
         if self.redis_client:
             try:
                 key = f"session:{session_id}"
-                data = self.redis_client.get(key)
-                if data:
-                    session_info = json.loads(data)
-                    return session_info.get("machine_id")
-            except (RedisError, json.JSONDecodeError):
-                pass
+                return self.redis_client.hget(key, "machine_id")
+            except RedisError as e:
+                self._mark_unavailable(e)
         return None
     
     
@@ -73,15 +98,15 @@ class SessionRegistry:
             try:
                 key = f"session:{session_id}"
                 self.redis_client.delete(key)
-            except RedisError:
-                pass
+            except RedisError as e:
+                self._mark_unavailable(e)
     
-    def extend_session_ttl(self, session_id: str, ttl: int = 3600):
+    def extend_session_ttl(self, session_id: str, ttl: int = settings.session_ttl):
         """Extend session TTL (call on each request)."""
         if self.redis_client:
             try:
                 key = f"session:{session_id}"
                 self.redis_client.expire(key, ttl)
-            except RedisError:
-                pass
+            except RedisError as e:
+                self._mark_unavailable(e)
 